@@ -1,15 +1,21 @@
 import asyncio
 import logging
-import json
+import logging.handlers
+import queue
 import csv
-import hashlib
+import atexit
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Union
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 import sys
 
+try:
+    from core.common import cached_sha256, check_hash_backend, dumps_json, run_streamed, utc_now
+except ImportError: # direkt als Skript gestartet (python core/SourceCodeManager.py)
+    from common import cached_sha256, check_hash_backend, dumps_json, run_streamed, utc_now
+
 # --- Konfiguration ---
 LOG_FILE = "package_manager.log"
 DEFAULT_LOG_LEVEL = logging.INFO
@@ -39,8 +45,12 @@ class BuildSystem(str, Enum):
     GO = "go"
     CARGO = "cargo"
 
+# Einmalig aufgebaute Lookup-Tabellen für die Enum-Konvertierung in _convert_enums
+_SOURCE_MAP = {s.value: s for s in SourceType}
+_BUILD_MAP = {b.value: b for b in BuildSystem}
+
 # --- Basis-Klasse für Pakete (Zellbaustein) ---
-@dataclass
+@dataclass(slots=True)
 class BasePackage:
     name: str
     version: str
@@ -48,9 +58,14 @@ class BasePackage:
     filepath: Optional[Path] = None  # Pfad zur lokalen Datei des Pakets
     build_system: Optional[Union[str, BuildSystem]] = None
     sha256: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=utc_now)
     metadata: Dict[str, Any] = field(default_factory=dict) # Für JPEGs, etc.
 
+    # (Objekt, String)-Paare - vermeiden isoformat()/str() bei jedem Export; an das
+    # Objekt gebunden, damit eine Neuzuweisung (z.B. filepath in main()) sie verwirft
+    _iso_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _filepath_str_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
     def __post_init__(self):
         self._validate_fields()
         self._convert_enums()
@@ -68,215 +83,242 @@ class BasePackage:
             self.filepath = Path(self.filepath)
 
     def _convert_enums(self):
-        if isinstance(self.source, str):
+        # Enum-Mitglieder sind selbst str, daher zuerst per exaktem Typvergleich
+        # durchwinken statt lower() + Lookup pro Instanz
+        if type(self.source) is not SourceType:
+            if not isinstance(self.source, str):
+                raise TypeError("source must be a string or SourceType Enum.")
             try:
-                self.source = SourceType(self.source.lower())
-            except ValueError:
-                raise ValueError(f"Invalid source type '{self.source}'. Allowed: {[s.value for s in SourceType]}")
-        elif not isinstance(self.source, SourceType):
-            raise TypeError("source must be a string or SourceType Enum.")
-
-        if self.build_system:
-            if isinstance(self.build_system, str):
-                try:
-                    self.build_system = BuildSystem(self.build_system.lower())
-                except ValueError:
-                    raise ValueError(f"Unsupported build system '{self.build_system}'. Allowed: {[b.value for b in BuildSystem]}")
-            elif not isinstance(self.build_system, BuildSystem):
+                self.source = _SOURCE_MAP[self.source.lower()]
+            except KeyError:
+                raise ValueError(f"Invalid source type '{self.source}'. Allowed: {list(_SOURCE_MAP)}")
+
+        if self.build_system and type(self.build_system) is not BuildSystem:
+            if not isinstance(self.build_system, str):
                 raise TypeError("build_system must be a string or BuildSystem Enum.")
+            try:
+                self.build_system = _BUILD_MAP[self.build_system.lower()]
+            except KeyError:
+                raise ValueError(f"Unsupported build system '{self.build_system}'. Allowed: {list(_BUILD_MAP)}")
 
     def set_metadata(self, key: str, value: Any) -> None:
         if not isinstance(key, str):
             raise TypeError("Metadata key must be a string.")
         self.metadata[key] = value
-        logging.debug(f"Metadata '{key}' set for package '{self.name}'.")
+        logging.debug("Metadata '%s' set for package '%s'.", key, self.name)
 
     def get_metadata(self, key: str, default: Any = None) -> Any:
         return self.metadata.get(key, default)
 
     async def calculate_sha256(self, force: bool = False) -> Optional[str]:
         if self.sha256 is not None and not force:
-            logging.debug(f"Using cached SHA256 for '{self.name}'.")
+            logging.debug("Using cached SHA256 for '%s'.", self.name)
             return self.sha256
         if not self.filepath or not self.filepath.is_file():
-            logging.warning(f"Cannot calculate SHA256 for '{self.name}': filepath not set or file does not exist.")
+            logging.warning("Cannot calculate SHA256 for '%s': filepath not set or file does not exist.", self.name)
             return None
 
-        logging.info(f"Calculating SHA256 for '{self.name}' at '{self.filepath}'...")
-        h = hashlib.sha256()
+        logging.info("Calculating SHA256 for '%s' at '%s'...", self.name, self.filepath)
         try:
-            with open(self.filepath, "rb") as f:
-                while chunk := await asyncio.to_thread(f.read, 4096): # non-blocking file read
-                    h.update(chunk)
-            self.sha256 = h.hexdigest()
-            logging.info(f"SHA256 calculated for '{self.name}': {self.sha256}")
+            # Ein einziger Thread-Hop für die ganze Datei statt einem pro 4-KiB-Block
+            # Über den Digest-Cache: unveränderte Dateien werden nicht erneut gelesen (außer bei force)
+            self.sha256 = await asyncio.to_thread(cached_sha256, self.filepath, force)
+            logging.info("SHA256 calculated for '%s': %s", self.name, self.sha256)
             return self.sha256
         except Exception as e:
-            logging.error(f"Error calculating SHA256 for '{self.name}': {e}")
+            logging.error("Error calculating SHA256 for '%s': %s", self.name, e)
+            return None
+
+    def _timestamp_iso(self) -> str:
+        cached = self._iso_cache
+        if cached is None or cached[0] is not self.timestamp:
+            cached = self._iso_cache = (self.timestamp, self.timestamp.isoformat())
+        return cached[1]
+
+    def _filepath_str(self) -> Optional[str]:
+        if not self.filepath:
             return None
+        cached = self._filepath_str_cache
+        if cached is None or cached[0] is not self.filepath:
+            cached = self._filepath_str_cache = (self.filepath, str(self.filepath))
+        return cached[1]
 
     def to_json_dict(self) -> Dict[str, Any]:
         """Konvertiert BasePackage-Objekt in ein JSON-serialisierbares Dictionary."""
-        d = asdict(self)
-        d['filepath'] = str(self.filepath) if self.filepath else None
-        d['timestamp'] = self.timestamp.isoformat()
-        if isinstance(d['source'], Enum): d['source'] = d['source'].value
-        if isinstance(d['build_system'], Enum): d['build_system'] = d['build_system'].value
-        return d
+        # Flache Feldkopie; asdict() würde metadata bei jedem Export rekursiv deep-copyen.
+        # source/build_system sind nach _convert_enums immer Enum-Mitglieder (bzw. None)
+        return {
+            'name': self.name,
+            'version': self.version,
+            'source': self.source.value,
+            'filepath': self._filepath_str(),
+            'build_system': self.build_system.value if self.build_system else None,
+            'sha256': self.sha256,
+            'timestamp': self._timestamp_iso(),
+            'metadata': self.metadata,
+        }
 
     def to_json(self) -> str:
-        return json.dumps(self.to_json_dict(), indent=2, ensure_ascii=False)
+        return dumps_json(self.to_json_dict()).decode('utf-8')
 
     def to_csv_dict(self, meta_prefix="meta_") -> Dict[str, Any]:
-        d = self.to_json_dict() # Nutze die JSON-Grundstruktur
-        d['filepath'] = d['filepath'] or '' # CSV braucht leere Strings statt None
-        d['build_system'] = d['build_system'] or ''
-        d['sha256'] = d['sha256'] or ''
+        # Direkte Projektion statt Umweg über to_json_dict(); CSV braucht leere Strings statt None
+        d = {
+            'name': self.name,
+            'version': self.version,
+            'source': self.source.value,
+            'filepath': self._filepath_str() or '',
+            'build_system': self.build_system.value if self.build_system else '',
+            'sha256': self.sha256 or '',
+            'timestamp': self._timestamp_iso(),
+        }
         # Flatten metadata keys with prefix
-        meta = d.pop("metadata", {})
-        for k, v in meta.items():
+        for k, v in self.metadata.items():
             d[f"{meta_prefix}{k}"] = v
         return d
 
     @staticmethod
     def _export_to_file(packages: List["BasePackage"], filepath: Path, exporter_func, mode: str, **kwargs) -> None:
         if not packages:
-            logging.warning(f"No packages to export to {filepath}.")
+            logging.warning("No packages to export to %s.", filepath)
             return
         try:
-            with open(filepath, mode, encoding='utf-8', **kwargs) as f:
+            with open(filepath, mode, **kwargs) as f:
                 exporter_func(packages, f)
-            logging.info(f"Packages successfully exported to {filepath}.")
+            logging.info("Packages successfully exported to %s.", filepath)
         except Exception as e:
-            logging.error(f"Failed to export packages to {filepath}: {e}")
+            logging.error("Failed to export packages to %s: %s", filepath, e)
             raise RuntimeError(f"Export failed: {e}")
 
     @staticmethod
     def export_to_csv(packages: List["BasePackage"], filepath: Path) -> None:
         def _write_csv(pkgs: List["BasePackage"], f):
-            keys = set()
-            rows = [p.to_csv_dict() for p in pkgs]
-            for row in rows:
-                keys.update(row.keys())
             # Stellen Sie sicher, dass wichtige Felder zuerst kommen
             ordered_keys = ['name', 'version', 'source', 'build_system', 'filepath', 'sha256', 'timestamp']
-            remaining_keys = sorted([k for k in keys if k not in ordered_keys])
+            # Restliche Spalten direkt aus den Metadaten-Schlüsseln statt aus allen Zeilen-Dicts
+            remaining_keys = sorted({f"meta_{k}" for p in pkgs for k in p.metadata})
             final_keys = ordered_keys + remaining_keys
 
-            writer = csv.DictWriter(f, fieldnames=final_keys)
-            writer.writeheader()
-            writer.writerows(rows)
+            # Zeilen werden beim Schreiben erzeugt und nicht vorab gesammelt;
+            # csv.writer spart den Schlüsselabgleich, den DictWriter pro Zeile macht
+            writer = csv.writer(f)
+            writer.writerow(final_keys)
+            writer.writerows([row.get(k, '') for k in final_keys] for row in (p.to_csv_dict() for p in pkgs))
         
-        BasePackage._export_to_file(packages, filepath, _write_csv, 'w', newline='')
+        BasePackage._export_to_file(packages, filepath, _write_csv, 'w', encoding='utf-8', newline='')
 
     @staticmethod
     def export_to_json(packages: List["BasePackage"], filepath: Path) -> None:
         def _write_json(pkgs: List["BasePackage"], f):
-            data = [p.to_json_dict() for p in pkgs]
-            json.dump(data, f, indent=2, ensure_ascii=False)
+            # Paket für Paket schreiben statt die ganze Liste im Speicher aufzubauen.
+            # Eingerückt wie json.dump(indent=2); JSON-Strings enthalten nie ein rohes \n.
+            f.write(b"[")
+            for i, p in enumerate(pkgs):
+                f.write(b",\n  " if i else b"\n  ")
+                f.write(dumps_json(p.to_json_dict()).replace(b"\n", b"\n  "))
+            f.write(b"\n]")
         
-        BasePackage._export_to_file(packages, filepath, _write_json, 'w')
+        BasePackage._export_to_file(packages, filepath, _write_json, 'wb')
 
     async def build(self) -> None:
         if not self.build_system:
-            logging.error(f"Cannot build package '{self.name}': No build system defined.")
+            logging.error("Cannot build package '%s': No build system defined.", self.name)
             raise RuntimeError("No build system defined.")
         
-        logging.info(f"Attempting to build package '{self.name}' using build system '{self.build_system.value}'...")
+        logging.info("Attempting to build package '%s' using build system '%s'...", self.name, self.build_system.value)
         
-        # Dispatch an spezialisierte, asynchrone Methoden oder an ein externes Build-System-Modul
-        build_func_name = f"_build_{self.build_system.value.replace('-', '_')}" # make-like names python-friendly
-        build_func = getattr(self, build_func_name, None)
+        # Dispatch an spezialisierte, asynchrone Methoden über die Tabelle am Klassenende
+        build_func = self._BUILD_DISPATCH.get(self.build_system)
 
-        if build_func and asyncio.iscoroutinefunction(build_func):
-            await build_func()
+        if build_func is not None:
+            await build_func(self)
         else:
-            logging.warning(f"No specific async build method found for {self.build_system.value}. Using generic build logic.")
+            logging.warning("No specific async build method found for %s. Using generic build logic.", self.build_system.value)
             # Hier könnte die Schnittstelle zu Ihrem C++ Build-System oder externen Tools sein
             # asyncio.create_subprocess_exec ist ideal für externe Prozesse
             print(f"Executing generic build for {self.name}...")
             # Beispiel: await asyncio.sleep(2) # Simuliere Arbeit
-            logging.info(f"Generic build for {self.name} completed.")
+            logging.info("Generic build for %s completed.", self.name)
 
 
     # --- Beispiel-Spezialmethoden für Build-Systeme (asynchron) ---
     async def _build_make(self):
-        logging.info(f"Starting async Make build for {self.name}...")
+        logging.info("Starting async Make build for %s...", self.name)
         # Hier würden Sie 'make' als Subprozess aufrufen
         try:
-            proc = await asyncio.create_subprocess_exec(
-                'make', '-C', str(self.filepath.parent), # Annahme: Makefile ist im Elternverzeichnis
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            returncode, _, stderr = await run_streamed(
+                'make', '-C', str(self.filepath.parent) # Annahme: Makefile ist im Elternverzeichnis
             )
-            stdout, stderr = await proc.communicate()
-            if proc.returncode == 0:
-                logging.info(f"Make build for {self.name} successful:\n{stdout.decode().strip()}")
+            if returncode == 0:
+                logging.info("Make build for %s successful.", self.name)
             else:
-                logging.error(f"Make build for {self.name} failed (Return Code: {proc.returncode}):\n{stderr.decode().strip()}")
+                logging.error("Make build for %s failed (Return Code: %s):\n%s", self.name, returncode, stderr)
                 raise RuntimeError(f"Make build failed for {self.name}")
         except FileNotFoundError:
             logging.error("Make command not found. Is Make installed and in PATH?")
             raise
         except Exception as e:
-            logging.error(f"An error occurred during Make build for {self.name}: {e}")
+            logging.error("An error occurred during Make build for %s: %s", self.name, e)
             raise
         
     async def _build_cmake(self):
-        logging.info(f"Starting async CMake build for {self.name}...")
+        logging.info("Starting async CMake build for %s...", self.name)
         # Beispiel: cmake konfigurieren und bauen
         build_dir = self.filepath.parent / "build"
         build_dir.mkdir(parents=True, exist_ok=True)
         try:
-            logging.debug(f"Running CMake configure in {build_dir} for {self.name}...")
-            proc_config = await asyncio.create_subprocess_exec(
-                'cmake', str(self.filepath.parent), '-B', str(build_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout_config, stderr_config = await proc_config.communicate()
-            if proc_config.returncode != 0:
-                logging.error(f"CMake configure for {self.name} failed:\n{stderr_config.decode().strip()}")
+            logging.debug("Running CMake configure in %s for %s...", build_dir, self.name)
+            returncode, _, stderr = await run_streamed('cmake', str(self.filepath.parent), '-B', str(build_dir))
+            if returncode != 0:
+                logging.error("CMake configure for %s failed:\n%s", self.name, stderr)
                 raise RuntimeError(f"CMake configure failed for {self.name}")
-            logging.debug(f"CMake configure output:\n{stdout_config.decode().strip()}")
 
-            logging.debug(f"Running CMake build in {build_dir} for {self.name}...")
-            proc_build = await asyncio.create_subprocess_exec(
-                'cmake', '--build', str(build_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout_build, stderr_build = await proc_build.communicate()
-            if proc_build.returncode == 0:
-                logging.info(f"CMake build for {self.name} successful:\n{stdout_build.decode().strip()}")
+            logging.debug("Running CMake build in %s for %s...", build_dir, self.name)
+            returncode, _, stderr = await run_streamed('cmake', '--build', str(build_dir))
+            if returncode == 0:
+                logging.info("CMake build for %s successful.", self.name)
             else:
-                logging.error(f"CMake build for {self.name} failed (Return Code: {proc_build.returncode}):\n{stderr_build.decode().strip()}")
+                logging.error("CMake build for %s failed (Return Code: %s):\n%s", self.name, returncode, stderr)
                 raise RuntimeError(f"CMake build failed for {self.name}")
         except FileNotFoundError:
             logging.error("CMake command not found. Is CMake installed and in PATH?")
             raise
         except Exception as e:
-            logging.error(f"An error occurred during CMake build for {self.name}: {e}")
+            logging.error("An error occurred during CMake build for %s: %s", self.name, e)
             raise
 
+    # Einmal beim Klassenaufbau aufgelöst statt getattr(f"_build_...") pro Aufruf
+    _BUILD_DISPATCH = {
+        BuildSystem.MAKE: _build_make,
+        BuildSystem.CMAKE: _build_cmake,
+    }
+
     def __repr__(self) -> str:
         return f"<BasePackage {self.name} v{self.version} ({self.source.value if isinstance(self.source, Enum) else self.source})>"
 
 # --- Initialisierung des Loggers (für das gesamte System) ---
 def setup_system_logging(log_level=DEFAULT_LOG_LEVEL):
+    # Datei- und Konsolen-Ausgabe laufen in einem Hintergrund-Thread; im Event-Loop
+    # kostet ein Log-Aufruf damit nur noch ein put() in die Queue
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        logging.FileHandler(LOG_FILE, encoding='utf-8'),
+        logging.StreamHandler(sys.stdout) # Auch auf Konsole ausgeben
+    )
+    listener.start()
+    atexit.register(listener.stop) # Restliche Einträge beim Beenden noch schreiben
     logging.basicConfig(
         level=log_level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE, encoding='utf-8'),
-            logging.StreamHandler(sys.stdout) # Auch auf Konsole ausgeben
-        ]
+        handlers=[logging.handlers.QueueHandler(log_queue)]
     )
     logging.getLogger(__name__).info("System logging initialized.")
 
 # --- Beispiel für die Nutzung (Asynchrone Event-Loop) ---
 async def main():
     setup_system_logging(logging.DEBUG) # Setze Level auf DEBUG für detaillierte Ausgabe
+    check_hash_backend()
     
     # Beispiel für ein lokales Paket
     local_pkg = BasePackage(
@@ -298,36 +340,40 @@ async def main():
 
     packages_to_manage = [local_pkg, github_pkg]
 
-    # Hashes berechnen
-    for pkg in packages_to_manage:
-        if pkg.filepath and pkg.filepath.is_dir(): # Nur für existierende lokale Verzeichnisse
-            await pkg.calculate_sha256() # Asynchron aufrufen
-        
+    # Hashes berechnen (unabhängige Pakete gleichzeitig)
+    await asyncio.gather(*(
+        pkg.calculate_sha256() for pkg in packages_to_manage
+        if pkg.filepath and pkg.filepath.is_dir() # Nur für existierende lokale Verzeichnisse
+    ))
+
     # Paket Metadaten setzen (z.B. das "JPEG" für GitHub-Paket)
     github_pkg.set_metadata("pictogram_binary_rep", "base64encoded_jpeg_data_here")
     
-    # Pakete bauen (asynchron)
-    for pkg in packages_to_manage:
+    # Pakete bauen (asynchron, die Build-Subprozesse laufen gleichzeitig)
+    async def build_package(pkg: BasePackage) -> None:
         try:
             # Für das Beispiel muss der filepath existieren und der Build-System-Befehl installiert sein.
             # Im realen System würden Sie hier vorher den Code klonen/herunterladen.
             if pkg.filepath and pkg.filepath.is_dir() and pkg.build_system:
                 await pkg.build()
             else:
-                logging.info(f"Skipping build for {pkg.name}: Filepath not valid or no build system specified.")
+                logging.info("Skipping build for %s: Filepath not valid or no build system specified.", pkg.name)
         except RuntimeError as e:
-            logging.error(f"Build process failed for {pkg.name}: {e}")
+            logging.error("Build process failed for %s: %s", pkg.name, e)
         except FileNotFoundError as e:
-             logging.error(f"Required build tool for {pkg.name} not found: {e}")
+             logging.error("Required build tool for %s not found: %s", pkg.name, e)
 
+    await asyncio.gather(*(build_package(pkg) for pkg in packages_to_manage))
 
-    # Pakete exportieren
+    # Pakete exportieren (beide Formate gleichzeitig)
     exported_packages = packages_to_manage
     try:
-        await asyncio.to_thread(BasePackage.export_to_json, exported_packages, Path("packages_export.json"))
-        await asyncio.to_thread(BasePackage.export_to_csv, exported_packages, Path("packages_export.csv"))
+        await asyncio.gather(
+            asyncio.to_thread(BasePackage.export_to_json, exported_packages, Path("packages_export.json")),
+            asyncio.to_thread(BasePackage.export_to_csv, exported_packages, Path("packages_export.csv")),
+        )
     except RuntimeError as e:
-        logging.error(f"Error during export: {e}")
+        logging.error("Error during export: %s", e)
 
     logging.info("Alien Package Manager 2.0 operations completed.")
 
@@ -341,7 +387,7 @@ if __name__ == "__main__":
         # Dummy CMakeLists.txt
         (dummy_source_path / "CMakeLists.txt").write_text("cmake_minimum_required(VERSION 3.10)\nproject(DummyProject)\nadd_executable(dummy_app main.cpp)")
         (dummy_source_path / "main.cpp").write_text("#include <iostream>\nint main() { std::cout << \"Hello from DummyApp!\" << std::endl; return 0; }")
-        logging.info(f"Dummy source directory created at {dummy_source_path}")
+        logging.info("Dummy source directory created at %s", dummy_source_path)
 
 
     asyncio.run(main())
@@ -0,0 +1,210 @@
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson # optional: deutlich schnellerer JSON-Encoder
+    # Gleiche Ausgabe wie json.dumps(indent=2, ensure_ascii=False)
+    ORJSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    orjson = None
+
+# Gemeinsame Helfer für tui.py, core/SourceCodeManager.py und core/db/orm.py.
+# asyncio, hashlib, mmap und sqlite3 werden erst in den Funktionen importiert, die sie
+# brauchen: core/db/orm.py importiert dieses Modul schon beim Laden
+
+# --- Konfiguration ---
+HASH_MMAP_THRESHOLD = 16 * 1024 * 1024 # Ab dieser Größe wird zum Hashen per mmap eingeblendet
+HASH_CHUNK_SIZE = 1 << 20 # Blockgröße für kleinere Dateien
+HASH_PROBE_SIZE = 16 * 1024 * 1024 # Testdaten für check_hash_backend()
+HASH_MIN_THROUGHPUT = 300 * 1000 * 1000 # Bytes/s; darunter fehlt vermutlich die Hardware-Beschleunigung
+SUBPROCESS_TAIL_LINES = 50 # Letzte Ausgabezeilen, die für Fehlermeldungen aufgehoben werden
+SUBPROCESS_LINE_LIMIT = 1 << 20 # Maximale Zeilenlänge beim Mitlesen von Subprozess-Ausgaben
+
+def utc_now() -> datetime:
+    # Ersatz für das ab 3.12 veraltete datetime.utcnow(); liefert einen UTC-bewussten Zeitstempel
+    return datetime.now(timezone.utc)
+
+# --- JSON-Serialisierung (orjson falls installiert, sonst json) ---
+def dumps_json(obj: Any, default=None) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    import json # nur im Fallback gebraucht
+    return json.dumps(obj, default=default, indent=2, ensure_ascii=False).encode('utf-8')
+
+# --- Hashing (synchron, läuft in einem Worker-Thread) ---
+# Ein wiederverwendeter Lesepuffer pro Worker-Thread statt neuer bytes-Objekte pro Block
+_hash_buffers = threading.local()
+
+def _get_hash_buffer() -> memoryview:
+    buf = getattr(_hash_buffers, 'buf', None)
+    if buf is None:
+        buf = _hash_buffers.buf = memoryview(bytearray(HASH_CHUNK_SIZE))
+    return buf
+
+def sha256_file(path: Path) -> str:
+    import hashlib
+    import mmap
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        if os.fstat(fd).st_size >= HASH_MMAP_THRESHOLD:
+            h = hashlib.sha256()
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                # posix_fadvise auf dem fd wirkt nicht auf die Seitenfehler des Mappings
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                h.update(mm) # hashlib gibt den GIL während des Updates frei
+            return h.hexdigest()
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+: Lese-/Update-Schleife komplett in C, ohne GIL
+            return hashlib.file_digest(f, hashlib.sha256).hexdigest()
+        # Fallback (Python < 3.11): ein wiederverwendeter Puffer per readinto()
+        h = hashlib.sha256()
+        buf = _get_hash_buffer()
+        while n := f.readinto(buf):
+            h.update(buf[:n])
+        return h.hexdigest()
+
+# --- Prüfung des Hash-Backends beim Start ---
+def check_hash_backend() -> None:
+    # hashlib delegiert SHA-256 an OpenSSL, das per SHA-NI/AVX2-Assembler rechnet. Ein Python
+    # ohne OpenSSL-Backend oder mit einem no-asm-Build hasht um ein Vielfaches langsamer.
+    # (OpenSSL < 1.1.1 muss nicht geprüft werden: CPython >= 3.10 lässt sich damit nicht bauen, PEP 644)
+    import hashlib
+    import time
+    if hashlib.sha256.__module__ != '_hashlib':
+        logging.warning("hashlib.sha256 is not backed by OpenSSL; package hashing will be slow.")
+    probe = bytes(HASH_PROBE_SIZE)
+    start = time.perf_counter()
+    hashlib.sha256(probe)
+    throughput = len(probe) / max(time.perf_counter() - start, 1e-9)
+    if throughput < HASH_MIN_THROUGHPUT:
+        logging.warning("SHA-256 runs at only %.0f MB/s; check that Python links an OpenSSL build with assembly enabled.", throughput / 1e6)
+
+# --- Subprozesse (Ausgabe zeilenweise streamen statt per communicate() puffern) ---
+async def _drain(stream: "asyncio.StreamReader", log_func, tail: deque) -> None:
+    import asyncio
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            line = e.partial # letzte Zeile ohne Zeilenumbruch (bzw. b"" am Ende)
+        except asyncio.LimitOverrunError:
+            # Zeile länger als SUBPROCESS_LINE_LIMIT: blockweise weiterlesen statt abzubrechen;
+            # readuntil() lässt die Daten dabei im Puffer, es geht nichts verloren
+            line = await stream.read(SUBPROCESS_LINE_LIMIT)
+        if not line:
+            break
+        text = line.decode(errors='replace').rstrip()
+        log_func(text)
+        tail.append(text)
+
+async def run_streamed(*cmd: str, stdout_log=logging.debug, stderr_log=logging.warning, **kwargs) -> Tuple[int, str, str]:
+    """
+    Startet einen Subprozess und loggt stdout/stderr zeilenweise, während sie entstehen.
+    Gibt Returncode sowie die letzten SUBPROCESS_TAIL_LINES Zeilen beider Streams zurück.
+    """
+    import asyncio
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=SUBPROCESS_LINE_LIMIT,
+        **kwargs
+    )
+    stdout_tail = deque(maxlen=SUBPROCESS_TAIL_LINES)
+    stderr_tail = deque(maxlen=SUBPROCESS_TAIL_LINES)
+    try:
+        await asyncio.gather(
+            _drain(proc.stdout, stdout_log, stdout_tail),
+            _drain(proc.stderr, stderr_log, stderr_tail),
+        )
+    except BaseException:
+        # Lesefehler oder Abbruch (z.B. Task-Cancel): Kindprozess nicht weiterlaufen lassen
+        if proc.returncode is None:
+            proc.kill()
+        raise
+    finally:
+        returncode = await proc.wait() # immer einsammeln, sonst bleibt ein Zombie zurück
+    return returncode, "\n".join(stdout_tail), "\n".join(stderr_tail)
+
+# --- Persistenter Digest-Cache (SQLite): (Pfad, Algorithmus) -> mtime_ns, Größe, Digest ---
+# Gemeinsam für alle drei BasePackage-Varianten. Unveränderte Dateien (gleiche mtime und Größe)
+# kosten so nur noch einen stat()-Aufruf; ALIENPIMP_HASH_CACHE=0 schaltet ihn ab
+HASH_CACHE_FILE = Path("~/.cache/alienpimp/hashes.sqlite").expanduser()
+
+# Eine SQLite-Verbindung pro Prozess, von den Hash-Threads unter dem Lock geteilt.
+# None = noch nicht geöffnet, False = nicht verfügbar
+_hash_cache_conn = None
+_hash_cache_lock = threading.Lock()
+
+def _hash_cache():
+    global _hash_cache_conn
+    if _hash_cache_conn is None:
+        import sqlite3
+        try:
+            HASH_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(HASH_CACHE_FILE, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Ein Eintrag pro (Pfad, Algorithmus); mtime/size entscheiden, ob er noch gilt
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hash_cache ("
+                "path TEXT, algo TEXT, mtime INTEGER, size INTEGER, digest TEXT, "
+                "PRIMARY KEY (path, algo))"
+            )
+        except (OSError, sqlite3.Error):
+            conn = False
+        _hash_cache_conn = conn
+    return _hash_cache_conn or None
+
+def _lookup_hash(path: str, algo: str, st: os.stat_result) -> Optional[str]:
+    import sqlite3
+    with _hash_cache_lock:
+        conn = _hash_cache()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT digest FROM hash_cache WHERE path = ? AND algo = ? AND mtime = ? AND size = ?",
+                (path, algo, st.st_mtime_ns, st.st_size),
+            ).fetchone()
+        except sqlite3.Error:
+            # Cache ist nur eine Abkürzung; im Zweifel wird neu gehasht
+            return None
+    return row[0] if row else None
+
+def _store_hash(path: str, algo: str, st: os.stat_result, digest: str) -> None:
+    import sqlite3
+    with _hash_cache_lock:
+        conn = _hash_cache()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO hash_cache (path, algo, mtime, size, digest) VALUES (?, ?, ?, ?, ?)",
+                (path, algo, st.st_mtime_ns, st.st_size, digest),
+            )
+        except sqlite3.Error:
+            pass
+
+def cached_sha256(path: Path, force: bool = False) -> str:
+    # force liest die Datei immer neu (mtime lässt sich per touch -d zurückdrehen),
+    # aktualisiert den Eintrag aber trotzdem
+    if os.environ.get("ALIENPIMP_HASH_CACHE", "1") == "0":
+        return sha256_file(path)
+    st = os.stat(path)
+    key = str(Path(path).resolve())
+    if not force:
+        digest = _lookup_hash(key, "sha256", st)
+        if digest is not None:
+            return digest
+    digest = sha256_file(path)
+    _store_hash(key, "sha256", st, digest)
+    return digest
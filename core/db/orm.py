@@ -1,11 +1,34 @@
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any, List, Union
-from pathlib import Path
+from pathlib import Path, PosixPath, WindowsPath
 from datetime import datetime
-import json
-import csv
 from enum import Enum
-import threading
+import logging
+import os
+
+from core.common import cached_sha256, dumps_json, orjson, utc_now
+
+
+# Exakter Typ -> Serializer; ein Dict-Lookup statt der isinstance-Kette im Normalfall
+_JSON_DISPATCH = {PosixPath: str, WindowsPath: str, datetime: datetime.isoformat}
+
+
+def _json_default(obj):
+    serializer = _JSON_DISPATCH.get(type(obj))
+    if serializer is not None:
+        return serializer(obj)
+    if isinstance(obj, Path):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def _dumps_package(pkg: "BasePackage") -> bytes:
+    # orjson serialisiert die Dataclass direkt, der json-Fallback braucht das Dict
+    return dumps_json(pkg if orjson is not None else pkg._to_dict(), default=_json_default)
 
 # Optional: Enum für Source und Build-System
 class SourceType(str, Enum):
@@ -26,7 +49,11 @@ class BuildSystem(str, Enum):
     WAF = "waf"
     SETUPTOOLS = "setuptools"
 
-@dataclass
+# Einmalig aufgebaute Lookup-Tabellen für die Enum-Konvertierung in __post_init__
+_SOURCE_MAP = {s.value: s for s in SourceType}
+_BUILD_MAP = {b.value: b for b in BuildSystem}
+
+@dataclass(slots=True)
 class BasePackage:
     name: str
     version: str
@@ -34,11 +61,11 @@ class BasePackage:
     filepath: Optional[Path] = None
     build_system: Optional[Union[str, BuildSystem]] = None
     sha256: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=utc_now)
     metadata: Dict[str, Any] = field(default_factory=dict)
 
-    # Interner Lock für Thread-Safety (optional)
-    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    # (timestamp, timestamp.isoformat()) - vermeidet isoformat() bei jedem Export
+    _iso_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         # Validierung und Typkonvertierung
@@ -46,26 +73,26 @@ class BasePackage:
             raise ValueError("Package name must be a non-empty string.")
         if not self.version or not isinstance(self.version, str):
             raise ValueError("Version must be a non-empty string.")
-        # Enum-Konvertierung (optional)
-        if isinstance(self.source, str):
-            try:
-                self.source = SourceType(self.source.lower())
-            except ValueError:
-                raise ValueError(f"Invalid source type '{self.source}'. Allowed: {[s.value for s in SourceType]}")
-        elif not isinstance(self.source, SourceType):
-            raise TypeError("source must be a string or SourceType Enum.")
+        # Enum-Konvertierung (optional). Enum-Mitglieder sind selbst str, daher zuerst
+        # per exaktem Typvergleich durchwinken statt lower() + Lookup pro Instanz
+        if type(self.source) is not SourceType:
+            if not isinstance(self.source, str):
+                raise TypeError("source must be a string or SourceType Enum.")
+            source = _SOURCE_MAP.get(self.source.lower())
+            if source is None:
+                raise ValueError(f"Invalid source type '{self.source}'. Allowed: {list(_SOURCE_MAP)}")
+            self.source = source
 
         if self.filepath and not isinstance(self.filepath, Path):
             self.filepath = Path(self.filepath)
 
-        if self.build_system:
-            if isinstance(self.build_system, str):
-                try:
-                    self.build_system = BuildSystem(self.build_system.lower())
-                except ValueError:
-                    raise ValueError(f"Unsupported build system '{self.build_system}'. Allowed: {[b.value for b in BuildSystem]}")
-            elif not isinstance(self.build_system, BuildSystem):
+        if self.build_system and type(self.build_system) is not BuildSystem:
+            if not isinstance(self.build_system, str):
                 raise TypeError("build_system must be a string or BuildSystem Enum.")
+            build_system = _BUILD_MAP.get(self.build_system.lower())
+            if build_system is None:
+                raise ValueError(f"Unsupported build system '{self.build_system}'. Allowed: {list(_BUILD_MAP)}")
+            self.build_system = build_system
 
         if not isinstance(self.metadata, dict):
             raise ValueError("Metadata must be a dictionary.")
@@ -73,56 +100,86 @@ class BasePackage:
         if not isinstance(self.timestamp, datetime):
             raise ValueError("Timestamp must be a datetime object.")
 
-    # Metadaten-Methoden mit Lock für Thread-Safety
+    # Metadaten-Methoden (dict get/set sind unter dem GIL atomar, kein Lock nötig)
     def set_metadata(self, key: str, value: Any) -> None:
         if not isinstance(key, str):
             raise TypeError("Metadata key must be a string.")
-        with self._lock:
-            self.metadata[key] = value
+        self.metadata[key] = value
 
     def get_metadata(self, key: str, default: Any = None) -> Any:
-        with self._lock:
-            return self.metadata.get(key, default)
+        return self.metadata.get(key, default)
 
     # Hash-Berechnung mit einfachem Cache
     def calculate_sha256(self, force: bool = False) -> str:
-        with self._lock:
-            if self.sha256 is not None and not force:
-                return self.sha256
-            if not self.filepath or not self.filepath.is_file():
-                raise FileNotFoundError("Filepath is not set or file does not exist.")
-            import hashlib
-            h = hashlib.sha256()
-            with open(self.filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    h.update(chunk)
-            self.sha256 = h.hexdigest()
+        if self.sha256 is not None and not force:
             return self.sha256
+        if not self.filepath or not self.filepath.is_file():
+            raise FileNotFoundError("Filepath is not set or file does not exist.")
+        # Unveränderte Dateien (gleiche mtime und Größe) kommen aus dem gemeinsamen Hash-Cache
+        self.sha256 = cached_sha256(self.filepath, force)
+        return self.sha256
+
+    @staticmethod
+    def prehash_bulk(packages: List["BasePackage"], max_workers: Optional[int] = None) -> None:
+        # hashlib gibt den GIL während update() frei, Threads hashen also echt parallel
+        pending = [p for p in packages if p.sha256 is None and p.filepath and p.filepath.is_file()]
+        if not pending:
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        # Doppelte Kernzahl: ein Teil der Threads wartet jeweils auf die Platte statt zu hashen
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) * 2, len(pending))
+
+        def _hash(p: "BasePackage") -> None:
+            # Ein unlesbares Paket bricht den Export nicht ab; sha256 bleibt dann leer
+            try:
+                p.calculate_sha256()
+            except OSError as e:
+                logging.warning("Could not hash %s for %s: %s", p.filepath, p.name, e)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            list(ex.map(_hash, pending))
+
+    def _timestamp_iso(self) -> str:
+        # Cache an das Zeitstempel-Objekt gebunden, damit eine Neuzuweisung ihn verwirft
+        cached = self._iso_cache
+        if cached is None or cached[0] is not self.timestamp:
+            cached = self._iso_cache = (self.timestamp, self.timestamp.isoformat())
+        return cached[1]
+
+    def _to_dict(self) -> Dict[str, Any]:
+        # Flache Feldkopie; asdict() würde metadata rekursiv deep-copyen
+        return {
+            'name': self.name,
+            'version': self.version,
+            'source': self.source,
+            'filepath': self.filepath,
+            'build_system': self.build_system,
+            'sha256': self.sha256,
+            'timestamp': self._timestamp_iso(),
+            'metadata': self.metadata,
+        }
 
     def to_json(self) -> str:
-        def serializer(obj):
-            if isinstance(obj, Path):
-                return str(obj)
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            if isinstance(obj, Enum):
-                return obj.value
-            raise TypeError(f"Type {type(obj)} not serializable")
-        return json.dumps(asdict(self), default=serializer, indent=2, ensure_ascii=False)
+        return _dumps_package(self).decode("utf-8")
+
+    # Feste CSV-Spalten in der Reihenfolge von to_csv_dict
+    CSV_COLUMNS = ('name', 'version', 'source', 'filepath', 'build_system', 'sha256', 'timestamp')
 
     def to_csv_dict(self, meta_prefix="meta_") -> Dict[str, Any]:
-        d = asdict(self)
-        d['filepath'] = str(self.filepath) if self.filepath else ''
-        d['timestamp'] = self.timestamp.isoformat()
-        d['sha256'] = self.sha256 or ''
-        # Enum-Werte als Strings
-        if isinstance(d['source'], Enum):
-            d['source'] = d['source'].value
-        if isinstance(d['build_system'], Enum):
-            d['build_system'] = d['build_system'].value if d['build_system'] else ''
+        # Direkte Projektion statt asdict(): kein rekursives Deep-Copy pro Export-Zeile
+        d = {
+            'name': self.name,
+            'version': self.version,
+            # Enum-Werte als Strings
+            'source': self.source.value if isinstance(self.source, Enum) else self.source,
+            'filepath': str(self.filepath) if self.filepath else '',
+            'build_system': self.build_system.value if isinstance(self.build_system, Enum) else (self.build_system or ''),
+            'sha256': self.sha256 or '',
+            'timestamp': self._timestamp_iso(),
+        }
         # Metadaten mit Präfix
-        meta = d.pop("metadata", {})
-        for k, v in meta.items():
+        for k, v in self.metadata.items():
             d[f"{meta_prefix}{k}"] = v
         return d
 
@@ -130,25 +187,34 @@ class BasePackage:
     def export_to_csv(packages: List["BasePackage"], filepath: Path) -> None:
         if not packages:
             return
-        keys = set()
-        rows = [p.to_csv_dict() for p in packages]
-        for row in rows:
-            keys.update(row.keys())
-        keys = sorted(keys)
+        import csv
+        BasePackage.prehash_bulk(packages)
+        # Header aus den festen Spalten plus den Metadaten-Schlüsseln (in Reihenfolge des
+        # ersten Auftretens); dafür reicht ein Blick auf metadata, ohne Zeilen-Dicts zu bauen.
+        # Erst nach dem Formatieren deduplizieren: 1 und '1' ergeben beide 'meta_1'
+        meta_keys = dict.fromkeys(f"meta_{k}" for p in packages for k in p.metadata)
+        keys = list(BasePackage.CSV_COLUMNS) + list(meta_keys)
         try:
             with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=keys)
-                writer.writeheader()
-                for row in rows:
-                    writer.writerow(row)
+                # Zeilen werden beim Schreiben erzeugt und nicht vorab gesammelt
+                writer = csv.writer(csvfile)
+                writer.writerow(keys)
+                writer.writerows([row.get(k, '') for k in keys] for row in (p.to_csv_dict() for p in packages))
         except Exception as e:
             raise RuntimeError(f"Failed to export CSV: {e}")
 
     @staticmethod
     def export_to_json(packages: List["BasePackage"], filepath: Path) -> None:
+        BasePackage.prehash_bulk(packages)
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump([json.loads(p.to_json()) for p in packages], f, indent=2, ensure_ascii=False)
+            # Paket für Paket schreiben statt die ganze Liste im Speicher aufzubauen.
+            # Eingerückt wie json.dump(indent=2); JSON-Strings enthalten nie ein rohes \n.
+            with open(filepath, 'wb') as f:
+                f.write(b"[")
+                for i, p in enumerate(packages):
+                    f.write(b",\n  " if i else b"\n  ")
+                    f.write(_dumps_package(p).replace(b"\n", b"\n  "))
+                f.write(b"\n]" if packages else b"]")
         except Exception as e:
             raise RuntimeError(f"Failed to export JSON: {e}")
 
@@ -156,10 +222,10 @@ class BasePackage:
     def build(self) -> None:
         if not self.build_system:
             raise RuntimeError("No build system defined.")
-        # Beispiel: Dispatch an spezialisierte Methoden
-        build_func = getattr(self, f"_build_{self.build_system.value}", None)
-        if callable(build_func):
-            build_func()
+        # Dispatch an spezialisierte Methoden über die Tabelle am Klassenende
+        build_func = self._BUILD_DISPATCH.get(self.build_system)
+        if build_func is not None:
+            build_func(self)
         else:
             # Default-Implementierung
             print(f"Building package {self.name} using generic build system '{self.build_system.value}'...")
@@ -171,6 +237,12 @@ class BasePackage:
     def _build_cmake(self):
         print(f"Building {self.name} using CMake...")
 
+    # Einmal beim Klassenaufbau aufgelöst statt getattr(f"_build_...") pro Aufruf
+    _BUILD_DISPATCH = {
+        BuildSystem.MAKE: _build_make,
+        BuildSystem.CMAKE: _build_cmake,
+    }
+
     def __repr__(self) -> str:
         return f"<BasePackage {self.name} v{self.version} ({self.source.value if isinstance(self.source, Enum) else self.source})>"
 
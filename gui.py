@@ -3,7 +3,6 @@ from tkinter import filedialog, messagebox, simpledialog
 from pathlib import Path
 from datetime import datetime
 from base_package import BasePackage  # Deine neue Klasse!
-import os
 
 class PackageGUI:
     def __init__(self, master):
@@ -59,7 +58,7 @@ class PackageGUI:
         path = filedialog.askopenfilename()
         if path:
             self.filepath = Path(path)
-            messagebox.showinfo("Datei gewählt", f"Datei: {os.path.basename(path)}")
+            messagebox.showinfo("Datei gewählt", f"Datei: {self.filepath.name}")
 
     def add_metadata(self):
         key = simpledialog.askstring("Metadatum", "Metadaten-Schlüssel:")
@@ -97,6 +96,7 @@ class PackageGUI:
             self.temp_metadata = {}
 
         # Hashes berechnen, falls Datei gewählt
+        # Erst hier prüfen: die Datei kann seit der Auswahl gelöscht oder ersetzt worden sein
         if pkg.filepath and pkg.filepath.is_file():
             pkg.calculate_all_hashes()
             info = f"SHA256: {pkg.sha256}\nSHA1: {pkg.sha1}\nMD5: {pkg.md5}"
@@ -18,7 +18,7 @@ setup(
     long_description_content_type="text/markdown",
     license="MIT",
     packages=find_packages(),
-    python_requires=">=3.8",
+    python_requires=">=3.10",
     install_requires=[
         "sqlalchemy>=1.4",
         "pandas>=1.3",
@@ -29,6 +29,9 @@ setup(
         "prompt_toolkit", 
         # ggf. weitere Abhängigkeiten hier eintragen
     ],
+    extras_require={
+        "fast": ["orjson"],  # schnellere JSON-Exporte, sonst stdlib json
+    },
     
     entry_points={
         "console_scripts": [
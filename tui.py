@@ -1,19 +1,27 @@
 import asyncio
 import logging
-import json
+import logging.handlers
+import queue
 import csv
 import hashlib
+import re
+import os
+import stat
+import atexit
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Union
-from dataclasses import dataclass, field, asdict
+from typing import Optional, Dict, Any, List, Union, Tuple
+from dataclasses import dataclass, field
 import sys
 import shutil # Für cleanup in main()
 
+from core.common import cached_sha256, check_hash_backend, dumps_json, run_streamed, utc_now
+
 # --- Konfiguration ---
 LOG_FILE = "package_manager.log"
 DEFAULT_LOG_LEVEL = logging.INFO
+GIT_CLONE_CONCURRENCY = 4 # Gleichzeitige git clone-Prozesse in main()
 
 # --- Enums für Typ-Sicherheit und Klarheit ---
 class SourceType(str, Enum):
@@ -41,8 +49,51 @@ class BuildSystem(str, Enum):
     CARGO = "cargo"
     TCC_BUILD = "tcc_build" 
 
+# Einmalig aufgebaute Lookup-Tabellen für die Enum-Konvertierung in _convert_enums
+_SOURCE_MAP = {s.value: s for s in SourceType}
+_BUILD_MAP = {b.value: b for b in BuildSystem}
+
+# --- Verzeichnis-Digest (für calculate_tree_digest) ---
+def _raise_walk_error(err: OSError) -> None:
+    raise err
+
+def _list_tree(root: Path) -> List[Tuple[str, Path]]:
+    # Alle Blätter unter root als (relativer POSIX-Pfad, Pfad), sortiert; ohne .git.
+    # os.walk folgt keinen Symlinks: verlinkte Verzeichnisse stehen nur in dirnames.
+    # Unlesbare Verzeichnisse brechen ab, statt stillschweigend aus dem Digest zu fallen
+    leaves = []
+    for dirpath, dirnames, filenames in os.walk(root, onerror=_raise_walk_error):
+        dirnames[:] = [d for d in dirnames if d != '.git']
+        names = filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+        for name in names:
+            path = Path(dirpath, name)
+            leaves.append((path.relative_to(root).as_posix(), path))
+    leaves.sort()
+    return leaves
+
+def _tree_leaf(path: Path) -> Optional[Tuple[int, str]]:
+    # (Modus, SHA256) wie in einem git-Tree: Symlinks über ihr Ziel statt über den Inhalt
+    # der Zieldatei, reguläre Dateien mit Exec-Bit (100755/100644); FIFOs usw. -> None.
+    # Dateiinhalte über den Digest-Cache, damit unveränderte Repos nicht neu gelesen werden
+    st = path.lstat()
+    if stat.S_ISLNK(st.st_mode):
+        return 0o120000, hashlib.sha256(os.fsencode(os.readlink(path))).hexdigest()
+    if stat.S_ISREG(st.st_mode):
+        return (0o100755 if st.st_mode & 0o111 else 0o100644), cached_sha256(path)
+    return None
+
+# Repositories, die unter dem GitHub-Konto M4tth4ck333 liegen (für source_from_name)
+_M4TTHACK_REPOS = frozenset({"theHarvester", "Tiny-C-Compiler", "weirdolib-ng", "hashcat", "social-engineer-toolkit"})
+
+# Diagnosezeilen in der TCC-Ausgabe, z.B. "temp_test.c:1: warning: implicit declaration of function 'printf'"
+_TCC_DIAG_RE = re.compile(r'^(?P<file>[^:\n]+):(?P<line>\d+):\s*(?P<message>.*)$', re.M)
+
+# pip sperrt site-packages nicht; gleichzeitige Installationen gemeinsamer Abhängigkeiten
+# würden sich gegenseitig überschreiben. PIP-Builds laufen daher nacheinander, make/cmake parallel.
+_pip_install_lock = asyncio.Lock()
+
 # --- Basis-Klasse für Pakete (Zellbaustein) ---
-@dataclass
+@dataclass(slots=True)
 class BasePackage:
     name: str
     version: str
@@ -50,9 +101,14 @@ class BasePackage:
     filepath: Optional[Path] = None  # Pfad zur lokalen Datei des Pakets
     build_system: Optional[Union[str, BuildSystem]] = None
     sha256: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=utc_now)
     metadata: Dict[str, Any] = field(default_factory=dict) # Für JPEGs, etc.
 
+    # (Objekt, String)-Paare - vermeiden isoformat()/str() bei jedem Export; an das
+    # Objekt gebunden, damit eine Neuzuweisung (z.B. filepath in main()) sie verwirft
+    _iso_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _filepath_str_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
     def __post_init__(self):
         self._validate_fields()
         self._convert_enums()
@@ -70,128 +126,186 @@ class BasePackage:
             self.filepath = Path(self.filepath)
 
     def _convert_enums(self):
-        if isinstance(self.source, str):
+        # Enum-Mitglieder sind selbst str, daher zuerst per exaktem Typvergleich
+        # durchwinken statt lower() + Lookup pro Instanz
+        if type(self.source) is not SourceType:
+            if not isinstance(self.source, str):
+                raise TypeError("source must be a string or SourceType Enum.")
             try:
-                self.source = SourceType(self.source.lower())
-            except ValueError:
-                raise ValueError(f"Invalid source type '{self.source}'. Allowed: {[s.value for s in SourceType]}")
-        elif not isinstance(self.source, SourceType):
-            raise TypeError("source must be a string or SourceType Enum.")
-
-        if self.build_system:
-            if isinstance(self.build_system, str):
-                try:
-                    self.build_system = BuildSystem(self.build_system.lower())
-                except ValueError:
-                    raise ValueError(f"Unsupported build system '{self.build_system}'. Allowed: {[b.value for b in BuildSystem]}")
-            elif not isinstance(self.build_system, BuildSystem):
+                self.source = _SOURCE_MAP[self.source.lower()]
+            except KeyError:
+                raise ValueError(f"Invalid source type '{self.source}'. Allowed: {list(_SOURCE_MAP)}")
+
+        if self.build_system and type(self.build_system) is not BuildSystem:
+            if not isinstance(self.build_system, str):
                 raise TypeError("build_system must be a string or BuildSystem Enum.")
+            try:
+                self.build_system = _BUILD_MAP[self.build_system.lower()]
+            except KeyError:
+                raise ValueError(f"Unsupported build system '{self.build_system}'. Allowed: {list(_BUILD_MAP)}")
 
     def set_metadata(self, key: str, value: Any) -> None:
         if not isinstance(key, str):
             raise TypeError("Metadata key must be a string.")
         self.metadata[key] = value
-        logging.debug(f"Metadata '{key}' set for package '{self.name}'.")
+        logging.debug("Metadata '%s' set for package '%s'.", key, self.name)
 
     def get_metadata(self, key: str, default: Any = None) -> Any:
         return self.metadata.get(key, default)
 
     async def calculate_sha256(self, force: bool = False) -> Optional[str]:
         if self.sha256 is not None and not force:
-            logging.debug(f"Using cached SHA256 for '{self.name}'.")
+            logging.debug("Using cached SHA256 for '%s'.", self.name)
             return self.sha256
         if not self.filepath or not self.filepath.is_file():
             # Wenn es ein Verzeichnis ist, sollte man einen Verzeichnis-Hash machen,
             # aber hier fokussieren wir auf eine einzelne Datei für SHA256
-            logging.warning(f"Cannot calculate SHA256 for '{self.name}': filepath not set or not a single file.")
+            logging.warning("Cannot calculate SHA256 for '%s': filepath not set or not a single file.", self.name)
             return None
 
-        logging.info(f"Calculating SHA256 for '{self.name}' at '{self.filepath}'...")
-        h = hashlib.sha256()
+        logging.info("Calculating SHA256 for '%s' at '%s'...", self.name, self.filepath)
         try:
-            with open(self.filepath, "rb") as f:
-                while chunk := await asyncio.to_thread(f.read, 4096): # non-blocking file read
-                    h.update(chunk)
-            self.sha256 = h.hexdigest()
-            logging.info(f"SHA256 calculated for '{self.name}': {self.sha256}")
+            # Ein einziger Thread-Hop für die ganze Datei statt einem pro 4-KiB-Block
+            # Über den Digest-Cache: unveränderte Dateien werden nicht erneut gelesen (außer bei force)
+            self.sha256 = await asyncio.to_thread(cached_sha256, self.filepath, force)
+            logging.info("SHA256 calculated for '%s': %s", self.name, self.sha256)
             return self.sha256
         except Exception as e:
-            logging.error(f"Error calculating SHA256 for '{self.name}': {e}")
+            logging.error("Error calculating SHA256 for '%s': %s", self.name, e)
+            return None
+
+    async def calculate_tree_digest(self) -> Optional[str]:
+        """
+        Merkle-artiger SHA256 über ein Verzeichnis (z.B. ein geklontes Repository):
+        jedes Blatt wird parallel in einem Worker-Thread gehasht, die Wurzel fasst die
+        nach relativem Pfad sortierten (Modus, Pfad, Digest)-Einträge wie ein git-Tree
+        zusammen. Symlinks werden nicht verfolgt, .git wird ausgelassen.
+        """
+        if not self.filepath or not self.filepath.is_dir():
+            logging.warning("Cannot calculate tree digest for '%s': filepath not set or not a directory.", self.name)
+            return None
+
+        logging.info("Calculating tree digest for '%s' at '%s'...", self.name, self.filepath)
+        try:
+            leaves = await asyncio.to_thread(_list_tree, self.filepath)
+            entries = await asyncio.gather(*(asyncio.to_thread(_tree_leaf, path) for _, path in leaves))
+            root = hashlib.sha256()
+            count = 0
+            for (rel_path, _), entry in zip(leaves, entries):
+                if entry is None:
+                    continue
+                mode, digest = entry
+                root.update(f"{mode:o} {rel_path}".encode('utf-8') + b"\0" + bytes.fromhex(digest))
+                count += 1
+            tree_digest = root.hexdigest()
+            logging.info("Tree digest calculated for '%s' (%s entries): %s", self.name, count, tree_digest)
+            return tree_digest
+        except Exception as e:
+            logging.error("Error calculating tree digest for '%s': %s", self.name, e)
             return None
 
+    def _timestamp_iso(self) -> str:
+        cached = self._iso_cache
+        if cached is None or cached[0] is not self.timestamp:
+            cached = self._iso_cache = (self.timestamp, self.timestamp.isoformat())
+        return cached[1]
+
+    def _filepath_str(self) -> Optional[str]:
+        if not self.filepath:
+            return None
+        cached = self._filepath_str_cache
+        if cached is None or cached[0] is not self.filepath:
+            cached = self._filepath_str_cache = (self.filepath, str(self.filepath))
+        return cached[1]
+
     def to_json_dict(self) -> Dict[str, Any]:
         """Konvertiert BasePackage-Objekt in ein JSON-serialisierbares Dictionary."""
-        d = asdict(self)
-        d['filepath'] = str(self.filepath) if self.filepath else None
-        d['timestamp'] = self.timestamp.isoformat()
-        if isinstance(d['source'], Enum): d['source'] = d['source'].value
-        if isinstance(d['build_system'], Enum): d['build_system'] = d['build_system'].value
-        return d
+        # Flache Feldkopie; asdict() würde metadata bei jedem Export rekursiv deep-copyen.
+        # source/build_system sind nach _convert_enums immer Enum-Mitglieder (bzw. None)
+        return {
+            'name': self.name,
+            'version': self.version,
+            'source': self.source.value,
+            'filepath': self._filepath_str(),
+            'build_system': self.build_system.value if self.build_system else None,
+            'sha256': self.sha256,
+            'timestamp': self._timestamp_iso(),
+            'metadata': self.metadata,
+        }
 
     def to_json(self) -> str:
-        return json.dumps(self.to_json_dict(), indent=2, ensure_ascii=False)
+        return dumps_json(self.to_json_dict()).decode('utf-8')
 
     def to_csv_dict(self, meta_prefix="meta_") -> Dict[str, Any]:
-        d = self.to_json_dict() # Nutze die JSON-Grundstruktur
-        d['filepath'] = d['filepath'] or '' # CSV braucht leere Strings statt None
-        d['build_system'] = d['build_system'] or ''
-        d['sha256'] = d['sha256'] or ''
+        # Direkte Projektion statt Umweg über to_json_dict(); CSV braucht leere Strings statt None
+        d = {
+            'name': self.name,
+            'version': self.version,
+            'source': self.source.value,
+            'filepath': self._filepath_str() or '',
+            'build_system': self.build_system.value if self.build_system else '',
+            'sha256': self.sha256 or '',
+            'timestamp': self._timestamp_iso(),
+        }
         # Flatten metadata keys with prefix
-        meta = d.pop("metadata", {})
-        for k, v in meta.items():
+        for k, v in self.metadata.items():
             d[f"{meta_prefix}{k}"] = v
         return d
 
     @staticmethod
     def _export_to_file(packages: List["BasePackage"], filepath: Path, exporter_func, mode: str, **kwargs) -> None:
         if not packages:
-            logging.warning(f"No packages to export to {filepath}.")
+            logging.warning("No packages to export to %s.", filepath)
             return
         try:
-            with open(filepath, mode, encoding='utf-8', **kwargs) as f:
+            with open(filepath, mode, **kwargs) as f:
                 exporter_func(packages, f)
-            logging.info(f"Packages successfully exported to {filepath}.")
+            logging.info("Packages successfully exported to %s.", filepath)
         except Exception as e:
-            logging.error(f"Failed to export packages to {filepath}: {e}")
+            logging.error("Failed to export packages to %s: %s", filepath, e)
             raise RuntimeError(f"Export failed: {e}")
 
     @staticmethod
     def export_to_csv(packages: List["BasePackage"], filepath: Path) -> None:
         def _write_csv(pkgs: List["BasePackage"], f):
-            keys = set()
-            rows = [p.to_csv_dict() for p in pkgs]
-            for row in rows:
-                keys.update(row.keys())
             # Stellen Sie sicher, dass wichtige Felder zuerst kommen
             ordered_keys = ['name', 'version', 'source', 'build_system', 'filepath', 'sha256', 'timestamp']
-            remaining_keys = sorted([k for k in keys if k not in ordered_keys])
+            # Restliche Spalten direkt aus den Metadaten-Schlüsseln statt aus allen Zeilen-Dicts
+            remaining_keys = sorted({f"meta_{k}" for p in pkgs for k in p.metadata})
             final_keys = ordered_keys + remaining_keys
 
-            writer = csv.DictWriter(f, fieldnames=final_keys)
-            writer.writeheader()
-            writer.writerows(rows)
+            # Zeilen werden beim Schreiben erzeugt und nicht vorab gesammelt;
+            # csv.writer spart den Schlüsselabgleich, den DictWriter pro Zeile macht
+            writer = csv.writer(f)
+            writer.writerow(final_keys)
+            writer.writerows([row.get(k, '') for k in final_keys] for row in (p.to_csv_dict() for p in pkgs))
         
-        BasePackage._export_to_file(packages, filepath, _write_csv, 'w', newline='')
+        BasePackage._export_to_file(packages, filepath, _write_csv, 'w', encoding='utf-8', newline='')
 
     @staticmethod
     def export_to_json(packages: List["BasePackage"], filepath: Path) -> None:
         def _write_json(pkgs: List["BasePackage"], f):
-            data = [p.to_json_dict() for p in pkgs]
-            json.dump(data, f, indent=2, ensure_ascii=False)
+            # Paket für Paket schreiben statt die ganze Liste im Speicher aufzubauen.
+            # Eingerückt wie json.dump(indent=2); JSON-Strings enthalten nie ein rohes \n.
+            f.write(b"[")
+            for i, p in enumerate(pkgs):
+                f.write(b",\n  " if i else b"\n  ")
+                f.write(dumps_json(p.to_json_dict()).replace(b"\n", b"\n  "))
+            f.write(b"\n]")
         
-        BasePackage._export_to_file(packages, filepath, _write_json, 'w')
+        BasePackage._export_to_file(packages, filepath, _write_json, 'wb')
 
     async def build(self) -> None:
         if not self.build_system:
-            logging.error(f"Cannot build package '{self.name}': No build system defined.")
+            logging.error("Cannot build package '%s': No build system defined.", self.name)
             raise RuntimeError("No build system defined.")
         
-        logging.info(f"Attempting to build package '{self.name}' using build system '{self.build_system.value}'...")
+        logging.info("Attempting to build package '%s' using build system '%s'...", self.name, self.build_system.value)
         
         # Vor dem Bauen prüfen, ob Klonen erforderlich ist
         if self.source in [SourceType.GITHUB, SourceType.GIT]:
             if not self.filepath or not self.filepath.is_dir():
-                logging.info(f"Source is '{self.source}', and filepath is not a valid directory. Attempting to clone.")
+                logging.info("Source is '%s', and filepath is not a valid directory. Attempting to clone.", self.source)
                 try:
                     await self._clone_repository()
                     # Nach dem Klonen den Hash neu berechnen, da die Datei jetzt lokal ist
@@ -199,34 +313,22 @@ class BasePackage:
                     # oder der Hash wird nach Installation des Pakets auf die Binary/Hauptdatei angewendet.
                     # await self.calculate_sha256(force=True) # Deaktiviert, da filepath jetzt ein Dir ist
                 except RuntimeError as e:
-                    logging.error(f"Failed to clone repository for {self.name}: {e}")
+                    logging.error("Failed to clone repository for %s: %s", self.name, e)
                     raise # Build kann nicht fortgesetzt werden ohne Quellcode
             else:
-                logging.info(f"Source is '{self.source}', and filepath '{self.filepath}' already exists. Skipping clone.")
-
-        # NEU: Spezielle Logik für theHarvester
-        if self.name == "theHarvester" and self.build_system == BuildSystem.PIP:
-            logging.info(f"Special build path detected for {self.name} using pip.")
-            await self._build_pip_install() # Neue Methode für pip
-        elif self.name == "social-engineer-toolkit" and self.build_system == BuildSystem.PIP:
-            logging.info(f"Special build path detected for {self.name} using pip.")
-            await self._build_pip_install() # Auch SET wird mit pip installiert
-        elif self.name == "Tiny-C-Compiler" and self.build_system == BuildSystem.TCC_BUILD:
-            logging.info(f"Special build path detected for {self.name}.")
-            await self._build_tcc()
-        else:
-            # Dispatch an spezialisierte, asynchrone Methoden oder an ein externes Build-System-Modul
-            build_func_name = f"_build_{self.build_system.value.replace('-', '_')}" # make-like names python-friendly
-            build_func = getattr(self, build_func_name, None)
+                logging.info("Source is '%s', and filepath '%s' already exists. Skipping clone.", self.source, self.filepath)
 
-            if build_func and asyncio.iscoroutinefunction(build_func):
-                await build_func()
-            else:
-                logging.warning(f"No specific async build method found for {self.build_system.value}. Using generic build logic.")
-                # Hier könnte die Schnittstelle zu Ihrem C++ Build-System oder externen Tools sein
-                print(f"Executing generic build for {self.name}...")
-                # Beispiel: await asyncio.sleep(2) # Simuliere Arbeit
-                logging.info(f"Generic build for {self.name} completed.")
+        # Dispatch an spezialisierte, asynchrone Methoden über die Tabelle am Klassenende
+        # (PIP z.B. für theHarvester und SET, TCC_BUILD für Tiny-C-Compiler)
+        build_func = self._BUILD_DISPATCH.get(self.build_system)
+        if build_func is not None:
+            await build_func(self)
+        else:
+            logging.warning("No specific async build method found for %s. Using generic build logic.", self.build_system.value)
+            # Hier könnte die Schnittstelle zu Ihrem C++ Build-System oder externen Tools sein
+            print(f"Executing generic build for {self.name}...")
+            # Beispiel: await asyncio.sleep(2) # Simuliere Arbeit
+            logging.info("Generic build for %s completed.", self.name)
 
     async def _clone_repository(self) -> None:
         """
@@ -242,7 +344,7 @@ class BasePackage:
              raise ValueError(f"Repository URL not found in metadata['repo_url'] for GIT source type.")
 
         if not repo_url:
-            logging.error(f"Cannot clone '{self.name}': No repository URL found in metadata or derivable from source.")
+            logging.error("Cannot clone '%s': No repository URL found in metadata or derivable from source.", self.name)
             raise RuntimeError(f"No repository URL specified for {self.name}.")
 
         # Zielpfad für das Klonen
@@ -251,104 +353,90 @@ class BasePackage:
             clone_dir = Path(clone_dir)
 
         if clone_dir.exists() and any(clone_dir.iterdir()):
-            logging.warning(f"Clone directory '{clone_dir}' for '{self.name}' already exists and is not empty. Skipping clone.")
+            logging.warning("Clone directory '%s' for '%s' already exists and is not empty. Skipping clone.", clone_dir, self.name)
             self.filepath = clone_dir # Setze filepath, auch wenn nicht geklont
             return
 
-        logging.info(f"Cloning repository '{repo_url}' for package '{self.name}' to '{clone_dir}'...")
+        logging.info("Cloning repository '%s' for package '%s' to '%s'...", repo_url, self.name, clone_dir)
         try:
-            proc = await asyncio.create_subprocess_exec(
-                'git', 'clone', repo_url, str(clone_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            # Für den Build reicht der aktuelle Stand: flacher, partieller Klon ohne Historie.
+            # GIT_TERMINAL_PROMPT=0 lässt git bei Auth-Abfragen sofort scheitern statt zu hängen.
+            returncode, _, stderr = await run_streamed(
+                'git', 'clone', '--depth=1', '--filter=blob:none', '--single-branch',
+                repo_url, str(clone_dir),
+                stderr_log=logging.debug, # git schreibt seinen Fortschritt nach stderr
+                env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
             )
-            stdout, stderr = await proc.communicate()
 
-            if proc.returncode == 0:
-                logging.info(f"Successfully cloned '{repo_url}' for '{self.name}'.")
+            if returncode == 0:
+                logging.info("Successfully cloned '%s' for '%s'.", repo_url, self.name)
                 self.filepath = clone_dir
             else:
-                logging.error(f"Failed to clone '{repo_url}' for '{self.name}' (Return Code: {proc.returncode}):\n{stderr.decode().strip()}")
+                logging.error("Failed to clone '%s' for '%s' (Return Code: %s):\n%s", repo_url, self.name, returncode, stderr)
                 raise RuntimeError(f"Git clone failed for {self.name}.")
         except FileNotFoundError:
             logging.error("Git command not found. Is Git installed and in PATH?")
             raise
         except Exception as e:
-            logging.error(f"An unexpected error occurred during cloning {self.name}: {e}")
+            logging.error("An unexpected error occurred during cloning %s: %s", self.name, e)
             raise
 
     # Hilfsfunktion, um den GitHub-Benutzernamen aus dem Paketnamen abzuleiten (Beispiel)
     def source_from_name(self) -> str:
         # Für M4tth4ck333 Repositories
-        if self.name in ["theHarvester", "Tiny-C-Compiler", "weirdolib-ng", "hashcat", "social-engineer-toolkit"]:
+        if self.name in _M4TTHACK_REPOS:
             return "M4tth4ck333"
         return self.metadata.get('github_user', 'default_github_user') 
 
     # --- Beispiel-Spezialmethoden für Build-Systeme (asynchron) ---
     async def _build_make(self):
-        logging.info(f"Starting async Make build for {self.name}...")
+        logging.info("Starting async Make build for %s...", self.name)
         if not self.filepath or not self.filepath.is_dir():
             raise RuntimeError(f"Cannot build {self.name}: filepath not set or not a directory after cloning.")
         try:
-            proc = await asyncio.create_subprocess_exec(
-                'make', '-C', str(self.filepath), 
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
-            if proc.returncode == 0:
-                logging.info(f"Make build for {self.name} successful:\n{stdout.decode().strip()}")
+            returncode, _, stderr = await run_streamed('make', '-C', str(self.filepath))
+            if returncode == 0:
+                logging.info("Make build for %s successful.", self.name)
             else:
-                logging.error(f"Make build for {self.name} failed (Return Code: {proc.returncode}):\n{stderr.decode().strip()}")
+                logging.error("Make build for %s failed (Return Code: %s):\n%s", self.name, returncode, stderr)
                 raise RuntimeError(f"Make build failed for {self.name}")
         except FileNotFoundError:
             logging.error("Make command not found. Is Make installed and in PATH?")
             raise
         except Exception as e:
-            logging.error(f"An error occurred during Make build for {self.name}: {e}")
+            logging.error("An error occurred during Make build for %s: %s", self.name, e)
             raise
         
     async def _build_cmake(self):
-        logging.info(f"Starting async CMake build for {self.name}...")
+        logging.info("Starting async CMake build for %s...", self.name)
         if not self.filepath or not self.filepath.is_dir():
             raise RuntimeError(f"Cannot build {self.name}: filepath not set or not a directory after cloning.")
         
         build_dir = self.filepath / "build" 
         build_dir.mkdir(parents=True, exist_ok=True)
         try:
-            logging.debug(f"Running CMake configure in {build_dir} for {self.name}...")
-            proc_config = await asyncio.create_subprocess_exec(
-                'cmake', str(self.filepath), '-B', str(build_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout_config, stderr_config = await proc_config.communicate()
-            if proc_config.returncode != 0:
-                logging.error(f"CMake configure for {self.name} failed:\n{stderr_config.decode().strip()}")
+            logging.debug("Running CMake configure in %s for %s...", build_dir, self.name)
+            returncode, _, stderr = await run_streamed('cmake', str(self.filepath), '-B', str(build_dir))
+            if returncode != 0:
+                logging.error("CMake configure for %s failed:\n%s", self.name, stderr)
                 raise RuntimeError(f"CMake configure failed for {self.name}")
-            logging.debug(f"CMake configure output:\n{stdout_config.decode().strip()}")
 
-            logging.debug(f"Running CMake build in {build_dir} for {self.name}...")
-            proc_build = await asyncio.create_subprocess_exec(
-                'cmake', '--build', str(build_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout_build, stderr_build = await proc_build.communicate()
-            if proc_build.returncode == 0:
-                logging.info(f"CMake build for {self.name} successful:\n{stdout_build.decode().strip()}")
+            logging.debug("Running CMake build in %s for %s...", build_dir, self.name)
+            returncode, _, stderr = await run_streamed('cmake', '--build', str(build_dir))
+            if returncode == 0:
+                logging.info("CMake build for %s successful.", self.name)
             else:
-                logging.error(f"CMake build for {self.name} failed (Return Code: {proc_build.returncode}):\n{stderr_build.decode().strip()}")
+                logging.error("CMake build for %s failed (Return Code: %s):\n%s", self.name, returncode, stderr)
                 raise RuntimeError(f"CMake build failed for {self.name}")
         except FileNotFoundError:
             logging.error("CMake command not found. Is CMake installed and in PATH?")
             raise
         except Exception as e:
-            logging.error(f"An error occurred during CMake build for {self.name}: {e}")
+            logging.error("An error occurred during CMake build for %s: %s", self.name, e)
             raise
 
     async def _build_tcc(self):
-        logging.info(f"Starting special TCC build for {self.name} with 2>&1 | gcc...")
+        logging.info("Starting special TCC build for %s...", self.name)
         if not self.filepath or not self.filepath.is_dir():
             raise RuntimeError(f"Cannot build {self.name}: filepath not set or not a directory after cloning.")
         
@@ -358,7 +446,7 @@ class BasePackage:
             # Wenn tcc nicht direkt ausführbar ist, müsste es erst gebaut werden (z.B. mit Make)
             # bevor es als Compiler genutzt werden kann. Das wäre ein vorgelagerter Schritt.
             # Für dieses Beispiel nehmen wir an, es ist da oder wird gefunden.
-            logging.warning(f"TCC compiler not found at expected path: {tcc_compiler_path}. Attempting to use system TCC if available.")
+            logging.warning("TCC compiler not found at expected path: %s. Attempting to use system TCC if available.", tcc_compiler_path)
             tcc_compiler_path = "tcc" # Fallback to system TCC
 
         test_c_file = self.filepath / "temp_test.c"
@@ -366,107 +454,107 @@ class BasePackage:
         test_c_file.write_text('int main() { printf("Hello from TCC build test!\\n"); return 0; }')
 
         try:
-            logging.debug(f"Compiling a dummy C file with TCC using '{tcc_compiler_path}' at {self.filepath}")
-            tcc_proc = await asyncio.create_subprocess_exec(
+            logging.debug("Compiling a dummy C file with TCC using '%s' at %s", tcc_compiler_path, self.filepath)
+            tcc_returncode, tcc_stdout, tcc_stderr = await run_streamed(
                 str(tcc_compiler_path),
                 str(test_c_file),
                 '-o', str(test_out_file),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
+                stdout_log=logging.info,
+                stderr_log=logging.info,
                 cwd=str(self.filepath) # Wichtig: CWD setzen, falls TCC relative Pfade erwartet
             )
-            tcc_stdout, tcc_stderr = await tcc_proc.communicate()
 
-            logging.info(f"TCC output (stdout):\n{tcc_stdout.decode().strip()}")
-            logging.info(f"TCC errors (stderr):\n{tcc_stderr.decode().strip()}")
-
-            if tcc_proc.returncode != 0:
-                logging.error(f"TCC compilation failed for {self.name} (Return Code: {tcc_proc.returncode})")
+            if tcc_returncode != 0:
+                logging.error("TCC compilation failed for %s (Return Code: %s)", self.name, tcc_returncode)
                 raise RuntimeError(f"TCC compilation failed for {self.name}")
             
-            # Hier der Part für "2>&1 | gcc" - Analyse der TCC-Ausgabe
-            combined_output = tcc_stdout + tcc_stderr
-            if combined_output:
-                logging.debug(f"Piping combined TCC output to GCC for analysis...")
-                gcc_proc = await asyncio.create_subprocess_exec(
-                    'gcc', '-x', 'c', '-', 
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    stdin=asyncio.subprocess.PIPE 
-                )
-                gcc_stdout, gcc_stderr = await gcc_proc.communicate(input=combined_output)
-                logging.info(f"GCC analysis output (stdout):\n{gcc_stdout.decode().strip()}")
-                logging.info(f"GCC analysis errors (stderr):\n{gcc_stderr.decode().strip()}")
-                if gcc_proc.returncode != 0:
-                    logging.warning(f"GCC analysis returned non-zero exit code {gcc_proc.returncode}. Might indicate issues.")
-            else:
-                logging.info("No TCC output to pipe to GCC for analysis.")
+            # Analyse der TCC-Ausgabe (2>&1) im Prozess statt über einen GCC-Aufruf,
+            # der die Log-Zeilen ohnehin nicht als C-Quelltext verstehen kann
+            combined_output = f"{tcc_stdout}\n{tcc_stderr}"
+            diagnostics = _TCC_DIAG_RE.findall(combined_output)
+            for diag_file, diag_line, diag_message in diagnostics:
+                logging.warning("TCC diagnostic for %s: %s:%s: %s", self.name, diag_file, diag_line, diag_message)
+            if not diagnostics:
+                logging.info("No diagnostics found in TCC output.")
 
-            logging.info(f"Special TCC build for {self.name} completed successfully.")
+            logging.info("Special TCC build for %s completed successfully.", self.name)
 
         except FileNotFoundError as e:
-            logging.error(f"Required command (TCC or GCC) not found for TCC build: {e}")
+            logging.error("Required command (TCC) not found for TCC build: %s", e)
             raise RuntimeError(f"Required command not found: {e}")
         except Exception as e:
-            logging.error(f"An error occurred during special TCC build for {self.name}: {e}")
+            logging.error("An error occurred during special TCC build for %s: %s", self.name, e)
             raise
 
     # NEU: Spezielle Build-Methode für PIP
     async def _build_pip_install(self):
-        logging.info(f"Starting pip installation for {self.name}...")
+        logging.info("Starting pip installation for %s...", self.name)
         if not self.filepath or not self.filepath.is_dir():
             raise RuntimeError(f"Cannot install {self.name}: filepath not set or not a directory after cloning.")
         
         try:
             # Installiere im "editable" Modus (-e) oder direkt aus dem Quellcode-Verzeichnis
             # Dies simuliert `pip install .` im Repository-Root
-            proc = await asyncio.create_subprocess_exec(
-                sys.executable, '-m', 'pip', 'install', str(self.filepath), # Installiere aus dem Verzeichnis
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
+            async with _pip_install_lock:
+                returncode, _, stderr = await run_streamed(
+                    sys.executable, '-m', 'pip', 'install', str(self.filepath) # Installiere aus dem Verzeichnis
+                )
 
-            if proc.returncode == 0:
-                logging.info(f"Successfully installed {self.name} via pip:\n{stdout.decode().strip()}")
+            if returncode == 0:
+                logging.info("Successfully installed %s via pip.", self.name)
                 # Optional: Nach erfolgreicher Installation den Pfad zur Haupt-Executable/Modul ermitteln
                 # und in filepath oder metadata speichern.
                 # Für theHarvester könnte das der Pfad zum theHarvester Skript sein.
                 installed_script = shutil.which(self.name) # Versuche, den installierten Pfad zu finden (z.B. 'theHarvester' oder 'setoolkit')
                 if installed_script:
                     self.set_metadata("installed_executable", str(installed_script))
-                    logging.info(f"Executable for {self.name} found at: {installed_script}")
+                    logging.info("Executable for %s found at: %s", self.name, installed_script)
                 else:
-                    logging.warning(f"Could not determine installed executable path for {self.name}.")
+                    logging.warning("Could not determine installed executable path for %s.", self.name)
             else:
-                logging.error(f"Pip installation failed for {self.name} (Return Code: {proc.returncode}):\n{stderr.decode().strip()}")
+                logging.error("Pip installation failed for %s (Return Code: %s):\n%s", self.name, returncode, stderr)
                 raise RuntimeError(f"Pip installation failed for {self.name}")
         except FileNotFoundError:
             logging.error("Python or Pip command not found. Is Python installed and in PATH?")
             raise
         except Exception as e:
-            logging.error(f"An error occurred during pip installation for {self.name}: {e}")
+            logging.error("An error occurred during pip installation for %s: %s", self.name, e)
             raise
 
+    # Einmal beim Klassenaufbau aufgelöst statt getattr(f"_build_...") pro Aufruf
+    _BUILD_DISPATCH = {
+        BuildSystem.MAKE: _build_make,
+        BuildSystem.CMAKE: _build_cmake,
+        BuildSystem.TCC_BUILD: _build_tcc,
+        BuildSystem.PIP: _build_pip_install,
+    }
 
     def __repr__(self) -> str:
         return f"<BasePackage {self.name} v{self.version} ({self.source.value if isinstance(self.source, Enum) else self.source})>"
 
 # --- Initialisierung des Loggers (für das gesamte System) ---
 def setup_system_logging(log_level=DEFAULT_LOG_LEVEL):
+    # Datei- und Konsolen-Ausgabe laufen in einem Hintergrund-Thread; im Event-Loop
+    # kostet ein Log-Aufruf damit nur noch ein put() in die Queue
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        logging.FileHandler(LOG_FILE, encoding='utf-8'),
+        logging.StreamHandler(sys.stdout) # Auch auf Konsole ausgeben
+    )
+    listener.start()
+    atexit.register(listener.stop) # Restliche Einträge beim Beenden noch schreiben
     logging.basicConfig(
         level=log_level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE, encoding='utf-8'),
-            logging.StreamHandler(sys.stdout) # Auch auf Konsole ausgeben
-        ]
+        handlers=[logging.handlers.QueueHandler(log_queue)]
     )
     logging.getLogger(__name__).info("System logging initialized.")
 
 # --- Beispiel für die Nutzung (Asynchrone Event-Loop) ---
 async def main():
     setup_system_logging(logging.DEBUG) # Setze Level auf DEBUG für detaillierte Ausgabe
+    check_hash_backend()
     
     # Beispiel für Tiny-C-Compiler
     tcc_package = BasePackage(
@@ -524,32 +612,66 @@ async def main():
         social_engineer_toolkit_package
     ]
 
-    for pkg in packages_to_manage:
-        try:
-            await pkg.build()
-            # SHA256 auf die Haupt-Executable/Installationsdateien anwenden, falls relevant
-            # Dies müsste spezifischer sein, z.B. Hash der installierten theHarvester Binary
-            # oder des TCC Compilers nach dem Build.
-            # Für Verzeichnisse ist ein rekursiver Hash nötig, hier übersprungen.
-            if pkg.name in ["theHarvester", "social-engineer-toolkit"] and pkg.get_metadata("installed_executable"):
-                 # Versuche, den Hash der installierten Binärdatei zu berechnen
-                 pkg.filepath = Path(pkg.get_metadata("installed_executable"))
-                 await pkg.calculate_sha256(force=True)
-            elif pkg.name == "Tiny-C-Compiler" and (pkg.filepath / "tcc").is_file():
-                 pkg.filepath = pkg.filepath / "tcc" # Hash des TCC-Compilers
-                 await pkg.calculate_sha256(force=True)
-            elif pkg.name == "hashcat" and (pkg.filepath / "hashcat").is_file(): # Annahme für hashcat binary
-                 pkg.filepath = pkg.filepath / "hashcat"
-                 await pkg.calculate_sha256(force=True)
-            elif pkg.name == "weirdolib-ng" and (pkg.filepath / "libweirdo.so").is_file(): # Annahme für eine lib
-                 pkg.filepath = pkg.filepath / "libweirdo.so" # Beispiel, muss überprüft werden
-                 await pkg.calculate_sha256(force=True)
-            else:
-                 logging.info(f"Skipping SHA256 calculation for {pkg.name} as no specific file to hash after build.")
-        except RuntimeError as e:
-            logging.error(f"Build process failed for {pkg.name}: {e}")
-        except FileNotFoundError as e:
-             logging.error(f"Required tool for {pkg.name} not found: {e}")
+    # Erst alle Repositories gleichzeitig klonen, damit die Builds nicht nacheinander
+    # auf das Netzwerk warten; build() überspringt das Klonen dann
+    clone_sem = asyncio.Semaphore(GIT_CLONE_CONCURRENCY)
+
+    async def clone_package(pkg: BasePackage) -> bool:
+        if pkg.source in (SourceType.GITHUB, SourceType.GIT) and not (pkg.filepath and pkg.filepath.is_dir()):
+            async with clone_sem:
+                try:
+                    await pkg._clone_repository()
+                except (RuntimeError, ValueError, FileNotFoundError) as e:
+                    logging.error("Failed to clone repository for %s: %s", pkg.name, e)
+                    return False
+        # Quellbaum vor dem Build festhalten, damit Build-Artefakte nicht in den Digest eingehen
+        if pkg.filepath and pkg.filepath.is_dir():
+            tree_digest = await pkg.calculate_tree_digest()
+            if tree_digest:
+                pkg.set_metadata("tree_sha256", tree_digest)
+        return True
+
+    # Builds nebenläufig; das Semaphor begrenzt gleichzeitig laufende Compiler-Prozesse
+    # (pip-Installationen serialisiert zusätzlich _pip_install_lock)
+    sem = asyncio.Semaphore(os.cpu_count() or 1)
+
+    async def build_package(pkg: BasePackage) -> bool:
+        async with sem:
+            try:
+                await pkg.build()
+                return True
+            except RuntimeError as e:
+                logging.error("Build process failed for %s: %s", pkg.name, e)
+            except FileNotFoundError as e:
+                 logging.error("Required tool for %s not found: %s", pkg.name, e)
+            return False
+
+    async def hash_package(pkg: BasePackage) -> None:
+        # SHA256 auf die Haupt-Executable/Installationsdateien anwenden, falls relevant
+        # Dies müsste spezifischer sein, z.B. Hash der installierten theHarvester Binary
+        # oder des TCC Compilers nach dem Build.
+        # Der Verzeichnis-Digest des Quellbaums steht bereits in metadata['tree_sha256'].
+        if pkg.name in ["theHarvester", "social-engineer-toolkit"] and pkg.get_metadata("installed_executable"):
+             # Versuche, den Hash der installierten Binärdatei zu berechnen
+             pkg.filepath = Path(pkg.get_metadata("installed_executable"))
+             await pkg.calculate_sha256()
+        elif pkg.name == "Tiny-C-Compiler" and (pkg.filepath / "tcc").is_file():
+             pkg.filepath = pkg.filepath / "tcc" # Hash des TCC-Compilers
+             await pkg.calculate_sha256()
+        elif pkg.name == "hashcat" and (pkg.filepath / "hashcat").is_file(): # Annahme für hashcat binary
+             pkg.filepath = pkg.filepath / "hashcat"
+             await pkg.calculate_sha256()
+        elif pkg.name == "weirdolib-ng" and (pkg.filepath / "libweirdo.so").is_file(): # Annahme für eine lib
+             pkg.filepath = pkg.filepath / "libweirdo.so" # Beispiel, muss überprüft werden
+             await pkg.calculate_sha256()
+        else:
+             logging.info("Skipping SHA256 calculation for %s as no specific file to hash after build.", pkg.name)
+
+    cloned = await asyncio.gather(*(clone_package(pkg) for pkg in packages_to_manage))
+    buildable = [pkg for pkg, ok in zip(packages_to_manage, cloned) if ok]
+    built = await asyncio.gather(*(build_package(pkg) for pkg in buildable))
+    # Eigene Stufe fürs Hashen: hashlib gibt den GIL frei, die Dateien werden parallel gehasht
+    await asyncio.gather(*(hash_package(pkg) for pkg, ok in zip(buildable, built) if ok))
 
 
     # Pakete exportieren
@@ -558,7 +680,7 @@ async def main():
         await asyncio.to_thread(BasePackage.export_to_json, exported_packages, Path("packages_export.json"))
         await asyncio.to_thread(BasePackage.export_to_csv, exported_packages, Path("packages_export.csv"))
     except RuntimeError as e:
-        logging.error(f"Error during export: {e}")
+        logging.error("Error during export: %s", e)
 
     logging.info("Alien Package Manager 2.0 operations completed.")
 
@@ -567,12 +689,12 @@ if __name__ == "__main__":
     async def cleanup_dummy_repos(paths: List[Path]):
         for path in paths:
             if path.exists() and path.is_dir():
-                logging.info(f"Cleaning up dummy repository at {path}...")
+                logging.info("Cleaning up dummy repository at %s...", path)
                 try:
                     await asyncio.to_thread(shutil.rmtree, path, ignore_errors=True) 
-                    logging.info(f"Cleaned up {path}")
+                    logging.info("Cleaned up %s", path)
                 except Exception as e:
-                    logging.error(f"Error during cleanup of {path}: {e}")
+                    logging.error("Error during cleanup of %s: %s", path, e)
 
     async def prepare_and_run():
         repos_to_clean = [
@@ -594,14 +716,14 @@ if __name__ == "__main__":
             (dummy_tcc_path / "tcc").write_text("#!/bin/bash\necho 'Simulating TCC compilation...'\nexit 0", encoding='utf-8')
             (dummy_tcc_path / "tcc").chmod(0o755) # Ausführbar machen
             (dummy_tcc_path / "temp_test.c").write_text('int main() { return 0; }', encoding='utf-8')
-            logging.info(f"Dummy TCC environment created at {dummy_tcc_path}")
+            logging.info("Dummy TCC environment created at %s", dummy_tcc_path)
 
         # Erstellen von Dummy Makefiles für weirdolib-ng und hashcat, falls die Klone leer bleiben
         dummy_weirdolib_path = Path("weirdolib-ng")
         if not dummy_weirdolib_path.exists():
             dummy_weirdolib_path.mkdir(parents=True, exist_ok=True)
             (dummy_weirdolib_path / "Makefile").write_text("all:\n\techo 'Building weirdolib-ng'", encoding='utf-8')
-            logging.info(f"Dummy weirdolib-ng environment created at {dummy_weirdolib_path}")
+            logging.info("Dummy weirdolib-ng environment created at %s", dummy_weirdolib_path)
             
         dummy_hashcat_path = Path("hashcat")
         if not dummy_hashcat_path.exists():
@@ -610,7 +732,7 @@ if __name__ == "__main__":
             # Füge eine Dummy-hashcat Binary hinzu, damit SHA256 berechnet werden kann
             (dummy_hashcat_path / "hashcat").write_text("#!/bin/bash\necho 'Simulating hashcat executable...'\nexit 0", encoding='utf-8')
             (dummy_hashcat_path / "hashcat").chmod(0o755)
-            logging.info(f"Dummy hashcat environment created at {dummy_hashcat_path}")
+            logging.info("Dummy hashcat environment created at %s", dummy_hashcat_path)
 
 
         # Für TheHarvester und SET Test: Nichts Besonderes außer dem Klonen. pip install . reicht.